@@ -1,8 +1,19 @@
+import numpy as np
 import pandas as pd
-import json
+import orjson
 import asyncio
-import aiohttp
-from datetime import datetime
+import itertools
+import logging
+import logging.handlers
+import hashlib
+import re
+import sqlite3
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+import httpx
+from aiolimiter import AsyncLimiter
 from tqdm import tqdm
 from dotenv import load_dotenv
 import os
@@ -17,131 +28,367 @@ GEOCODING_ENABLED = bool(GOOGLE_MAPS_API_KEY)
 if not GEOCODING_ENABLED:
     print("Warning: Google Maps API key not found. Geocoding will be disabled.")
 
+# Per-station geocoding messages are buffered and written in batches so the
+# event loop doesn't block on stdout; successes are only shown at DEBUG level
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(logging.Formatter("%(message)s"))
+geocoding_log_handler = logging.handlers.MemoryHandler(1024, target=_console_handler)
+logger.addHandler(geocoding_log_handler)
+
+# Output format: "json" (a single JSON array) or "ndjson" (one station per line)
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "json").lower()
+
+# Google allows up to 50 geocoding requests per second
+GOOGLE_MAX_QPS = 50
+google_rate_limiter = AsyncLimiter(GOOGLE_MAX_QPS, 1)
+
+# Nominatim (OpenStreetMap) is used as a fallback for addresses Google can't
+# resolve. Its usage policy allows 1 request per second with an identifying
+# User-Agent.
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+NOMINATIM_USER_AGENT = (
+    "prices_to_stations (+https://github.com/josemqu/prices_to_stations)"
+)
+nominatim_rate_limiter = AsyncLimiter(1, 1)
+
+# Persistent geocoding cache
+GEOCODE_CACHE_FILE = "geocode_cache.sqlite"
+# How long a "not found" answer is trusted before the address is retried
+NEGATIVE_CACHE_TTL = 30 * 24 * 60 * 60  # 30 days
+
+# Stations whose address is too incomplete to geocode reliably
+SKIPPED_STATIONS_FILE = "stations_skipped.csv"
+
+# Columns read from the input CSV (the rest of the file is never used)
+CSV_COLUMNS = [
+    "idempresa",
+    "empresa",
+    "direccion",
+    "localidad",
+    "provincia",
+    "empresabandera",
+    "idempresabandera",
+    "latitud",
+    "longitud",
+    "idproducto",
+    "producto",
+    "precio",
+    "fecha_vigencia",
+    "tipohorario",
+    "idtipohorario",
+]
+
+# Text columns, stored as Arrow-backed strings instead of Python objects
+STRING_COLUMNS = [
+    "empresa",
+    "direccion",
+    "localidad",
+    "provincia",
+    "empresabandera",
+    "producto",
+    "tipohorario",
+    "fecha_vigencia",
+]
+
+# Float columns that may contain blanks or stray text
+NUMERIC_COLUMNS = ["latitud", "longitud", "precio"]
+
+# Columns holding station attributes (taken from the most recent row), mapped
+# to their names in the stations table
+STATION_COLUMNS = {
+    "idempresa": "stationId",
+    "empresa": "stationName",
+    "direccion": "address",
+    "localidad": "town",
+    "provincia": "province",
+    "empresabandera": "flag",
+    "idempresabandera": "flagId",
+    "latitud": "lat",
+    "longitud": "lng",
+}
+
+# Columns needed to build each price entry
+PRICE_COLUMNS = [
+    "precio",
+    "fecha_vigencia_iso",
+    "tipohorario",
+    "idtipohorario",
+]
+
+
+def normalize_address(address):
+    """
+    Normalize an address so trivially different spellings share a cache entry
+    (strip, lowercase, collapse whitespace and fold accents)
+    """
+    address = unicodedata.normalize("NFKD", str(address))
+    address = "".join(c for c in address if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", address.strip().lower())
+
+
+@lru_cache(maxsize=50_000)
+def address_cache_key(address):
+    """
+    Build the geocoding cache key for an address (memoized, since the same
+    address is keyed several times per run)
+    """
+    return hashlib.blake2b(
+        normalize_address(address).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+class GeocodeCache:
+    """
+    SQLite-backed cache of geocoding results keyed by normalized address.
+    Successful lookups are kept forever, "not found" answers expire after
+    NEGATIVE_CACHE_TTL seconds so broken addresses are eventually retried.
+    Writes are committed in batches of commit_every rows and on close, since
+    each commit is a blocking disk sync inside the event loop.
+    """
+
+    def __init__(
+        self,
+        path=GEOCODE_CACHE_FILE,
+        negative_ttl=NEGATIVE_CACHE_TTL,
+        commit_every=100,
+    ):
+        self.negative_ttl = negative_ttl
+        self.commit_every = commit_every
+        self.pending_writes = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                addr_hash TEXT PRIMARY KEY,
+                lat REAL,
+                lng REAL,
+                status TEXT,
+                ts INTEGER,
+                source TEXT
+            )
+            """
+        )
+        # Caches created before the Nominatim fallback have no source column
+        columns = [
+            row[1] for row in self.conn.execute("PRAGMA table_info(geocode_cache)")
+        ]
+        if "source" not in columns:
+            self.conn.execute("ALTER TABLE geocode_cache ADD COLUMN source TEXT")
+        self.conn.commit()
+
+    def get(self, key):
+        """
+        Args:
+            key (str): Cache key from address_cache_key
+        Returns:
+            tuple: (latitude, longitude, status, source) or None on a miss
+        """
+        row = self.conn.execute(
+            "SELECT lat, lng, status, ts, source FROM geocode_cache"
+            " WHERE addr_hash = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        lat, lng, status, ts, source = row
+        if status != "OK" and time.time() - ts > self.negative_ttl:
+            return None
+        return lat, lng, status, source
+
+    def set(self, key, lat, lng, status, source):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache"
+            " (addr_hash, lat, lng, status, ts, source) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, lat, lng, status, int(time.time()), source),
+        )
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_writes = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
 
-async def geocode_address_async(session, address):
+
+async def geocode_address_async(client, address, cache=None):
     """
     Geocode a single address asynchronously using Google Maps API
     Args:
-        session: aiohttp.ClientSession
+        client: httpx.AsyncClient
         address (str): Address to geocode
+        cache (GeocodeCache): Optional cache checked before calling the API
     Returns:
-        tuple: (latitude, longitude) or (None, None) if geocoding fails or is disabled
+        tuple: (latitude, longitude, status) where status is Google's answer
+            ("OK", "ZERO_RESULTS", "OVER_QUERY_LIMIT", ...) or None if the
+            request failed or geocoding is disabled
     """
     if not GEOCODING_ENABLED or not address or pd.isna(address):
-        return None, None
+        return None, None, None
+
+    key = address_cache_key(address)
+    if cache is not None:
+        cached = cache.get(key)
+        # Any fresh entry wins, including addresses resolved by the fallback
+        if cached is not None:
+            lat, lng, status, _ = cached
+            return lat, lng, status
+
     url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {"address": address, "key": GOOGLE_MAPS_API_KEY, "region": "ar"}
     try:
-        async with session.get(url, params=params, timeout=10) as resp:
-            data = await resp.json()
-            if data.get("status") == "OK" and data.get("results"):
-                location = data["results"][0]["geometry"]["location"]
-                return location["lat"], location["lng"]
-            print(f"Error geocoding address '{address}': {data.get('status')}")
-            return None, None
+        async with google_rate_limiter:
+            resp = await client.get(url, params=params)
+        data = resp.json()
+        status = data.get("status")
+        if status == "OK" and data.get("results"):
+            location = data["results"][0]["geometry"]["location"]
+            if cache is not None:
+                cache.set(key, location["lat"], location["lng"], status, "google")
+            return location["lat"], location["lng"], status
+        # Only cache definitive misses, not quota or transient errors
+        if status == "ZERO_RESULTS" and cache is not None:
+            cache.set(key, None, None, status, "google")
+        logger.warning("Error geocoding address '%s': %s", address, status)
+        return None, None, status
     except Exception as e:
-        print(f"Error geocoding address '{address}': {str(e)}")
-        return None, None
+        logger.warning("Error geocoding address '%s': %s", address, e)
+        return None, None, None
 
 
-def parse_date(date_str):
+async def geocode_nominatim(client, address, cache=None):
     """
-    Parse date string from DD/MM/YYYY HH:MM format to datetime object
+    Geocode a single address asynchronously using Nominatim (OpenStreetMap)
+    Args:
+        client: httpx.AsyncClient
+        address (str): Address to geocode
+        cache (GeocodeCache): Optional cache checked before calling the API
+    Returns:
+        tuple: (latitude, longitude) or (None, None) if geocoding fails
     """
+    if not address or pd.isna(address):
+        return None, None
+
+    key = address_cache_key(address)
+    if cache is not None:
+        cached = cache.get(key)
+        # A cached Google miss is exactly what we fall back for, so only
+        # trust hits and misses already confirmed by Nominatim
+        if cached is not None:
+            lat, lng, status, source = cached
+            if status == "OK" or source == "nominatim":
+                return lat, lng
+
+    params = {"format": "json", "q": address, "countrycodes": "ar", "limit": 1}
+    headers = {"User-Agent": NOMINATIM_USER_AGENT}
     try:
-        return datetime.strptime(date_str, "%d/%m/%Y %H:%M")
+        async with nominatim_rate_limiter:
+            resp = await client.get(NOMINATIM_URL, params=params, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        if data:
+            lat, lng = float(data[0]["lat"]), float(data[0]["lon"])
+            if cache is not None:
+                cache.set(key, lat, lng, "OK", "nominatim")
+            return lat, lng
+        if cache is not None:
+            cache.set(key, None, None, "ZERO_RESULTS", "nominatim")
+        logger.warning(
+            "Error geocoding address '%s' with Nominatim: ZERO_RESULTS", address
+        )
+        return None, None
     except Exception as e:
-        print(f"Error parsing date {date_str}: {e}")
-        return None
-
-
-def format_date(dt):
-    """
-    Format datetime object to ISO 8601 format with timezone
-    """
-    return dt.strftime("%Y-%m-%dT%H:%M:%SZ") if dt else None
+        logger.warning("Error geocoding address '%s' with Nominatim: %s", address, e)
+        return None, None
 
 
-def process_stations(df):
+def process_stations(df, show_progress=True):
     """
     Process the stations data and group prices by station and product
 
     Args:
         df (DataFrame): Input DataFrame with price data
+        show_progress (bool): Whether to display progress bars
 
     Returns:
-        dict: Processed stations data with prices
+        tuple: (stations_df, products) where stations_df has one row per station
+            and products maps each station id to its products with prices
     """
     # Sort by date to get the most recent price first
-    df["fecha_vigencia_dt"] = df["fecha_vigencia"].apply(parse_date)
-    df = df.sort_values("fecha_vigencia_dt", ascending=False)
-
-    # Dictionary to store stations data
-    stations = {}
+    df["fecha_vigencia_dt"] = pd.to_datetime(
+        df["fecha_vigencia"], format="%d/%m/%Y %H:%M", errors="coerce", cache=True
+    )
+    # ISO 8601 output dates are formatted once for the whole column
+    df["fecha_vigencia_iso"] = df["fecha_vigencia_dt"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    df.sort_values("fecha_vigencia_dt", ascending=False, inplace=True, kind="stable")
+    # Dumps repeat rows; keep one price per station, product, date and hour type
+    df.drop_duplicates(
+        subset=["idempresa", "idproducto", "fecha_vigencia", "idtipohorario"],
+        keep="first",
+        inplace=True,
+    )
 
-    # Group by station
-    for station_id, station_group in tqdm(
-        df.groupby("idempresa"), desc="Processing stations"
-    ):
-        # Get station info from first row (most recent data)
-        first_row = station_group.iloc[0]
-
-        # Create station entry if it doesn't exist
-        if station_id not in stations:
-            station = {
-                "stationId": int(station_id),
-                "stationName": first_row["empresa"],
-                "address": first_row["direccion"],
-                "town": first_row["localidad"],
-                "province": first_row["provincia"],
-                "flag": first_row["empresabandera"],
-                "flagId": int(first_row["idempresabandera"]),
-                "coordinates": {
-                    "lat": (
-                        float(first_row["latitud"])
-                        if pd.notna(first_row["latitud"])
-                        else None
-                    ),
-                    "lng": (
-                        float(first_row["longitud"])
-                        if pd.notna(first_row["longitud"])
-                        else None
-                    ),
-                },
-                "products": {},
-            }
-            stations[station_id] = station
-        else:
-            station = stations[station_id]
+    # Station info comes from the first row (most recent data) of each station
+    stations_df = (
+        df.groupby("idempresa", as_index=False)
+        .first(skipna=False)[list(STATION_COLUMNS)]
+        .rename(columns=STATION_COLUMNS)
+    )
+    # Plain float64 coordinates so missing values are NaN for vectorized checks
+    for column in ["lat", "lng"]:
+        stations_df[column] = stations_df[column].to_numpy(
+            dtype=np.float64, na_value=np.nan
+        )
 
-        # Process products
-        for (product_id, product_name), product_group in station_group.groupby(
-            ["idproducto", "producto"]
-        ):
-            product_key = f"{product_id}_{product_name}"
+    # Order rows by station and product; the stable sort keeps the most
+    # recent price first within each (station, product) run
+    df.sort_values(["idempresa", "idproducto"], inplace=True, kind="stable")
+
+    # Missing values become None up front so the row loop needs no checks
+    prices = df[PRICE_COLUMNS]
+    price_values = prices.astype(object).where(prices.notna(), None).to_numpy()
+    product_names = df["producto"].to_numpy(dtype=object, na_value=None)
+    # Object arrays keep missing ids as None (float arrays would turn them
+    # into NaN and every other id into a float)
+    keys = zip(
+        df["idempresa"].to_numpy(dtype=object, na_value=None).tolist(),
+        df["idproducto"].to_numpy(dtype=object, na_value=None).tolist(),
+    )
 
-            if product_key not in station["products"]:
-                station["products"][product_key] = {
+    # Walk contiguous (station, product) runs in a single pass
+    products = {}
+    start = 0
+    with tqdm(
+        total=len(df), desc="Processing prices", disable=not show_progress
+    ) as progress:
+        for (station_id, product_id), run in itertools.groupby(keys):
+            end = start + sum(1 for _ in run)
+            if station_id is not None and product_id is not None:
+                products.setdefault(station_id, {})[product_id] = {
                     "productId": int(product_id),
-                    "productName": product_name,
-                    "prices": [],
+                    "productName": product_names[start],
+                    "prices": [
+                        {
+                            "price": precio,
+                            "date": fecha_vigencia_iso,
+                            "hourType": tipohorario,
+                            "hourTypeId": idtipohorario,
+                        }
+                        for precio, fecha_vigencia_iso, tipohorario, idtipohorario in (
+                            price_values[start:end].tolist()
+                        )
+                    ],
                 }
+            progress.update(end - start)
+            start = end
 
-            # Add prices
-            for _, price_row in product_group.iterrows():
-                price_entry = {
-                    "price": (
-                        float(price_row["precio"])
-                        if pd.notna(price_row["precio"])
-                        else None
-                    ),
-                    "date": format_date(price_row["fecha_vigencia_dt"]),
-                    "hourType": price_row["tipohorario"],
-                    "hourTypeId": int(price_row["idtipohorario"]),
-                }
-                station["products"][product_key]["prices"].append(price_entry)
-
-    return stations
+    return stations_df, products
 
     # Save the updated CSV for future use
     df.to_csv("precios-historicos-updated.csv", index=False)
@@ -150,79 +397,237 @@ def process_stations(df):
     )
 
 
-async def validate_and_geocode_stations(stations, concurrent_requests=5):
+def process_stations_parallel(df, workers=None):
+    """
+    Process the stations data across CPU cores. Rows are sharded by station id,
+    so every station is handled entirely by a single worker.
+
+    Args:
+        df (DataFrame): Input DataFrame with price data
+        workers (int): Number of worker processes (defaults to the CPU count)
+
+    Returns:
+        tuple: (stations_df, products) as returned by process_stations, with
+            stations ordered by station id
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return process_stations(df)
+
+    # Arrow-backed integer columns don't support %, so shard on the group number
+    shard_ids = df.groupby("idempresa").ngroup() % workers
+    shards = [df[shard_ids == k] for k in range(workers)]
+
+    station_frames = []
+    products = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard_stations_df, shard_products in tqdm(
+            executor.map(partial(process_stations, show_progress=False), shards),
+            total=workers,
+            desc="Processing shards",
+        ):
+            # Station ids never repeat across shards, so a plain update merges
+            station_frames.append(shard_stations_df)
+            products.update(shard_products)
+
+    stations_df = pd.concat(station_frames, ignore_index=True).sort_values(
+        "stationId", ignore_index=True
+    )
+    return stations_df, products
+
+
+def clean_text(value):
+    """
+    Strip a text value, mapping missing values to an empty string
+    """
+    return str(value).strip() if pd.notna(value) else ""
+
+
+def station_address(station):
+    """
+    Build the full address sent to the geocoders for a station, leaving out
+    missing parts so no "None"/"nan" placeholders reach the query
+    """
+    parts = [
+        clean_text(station["address"]),
+        clean_text(station["town"]),
+        clean_text(station["province"]),
+        "Argentina",
+    ]
+    return ", ".join(part for part in parts if part)
+
+
+def is_geocodable(station):
+    """
+    Check whether a station's address is specific enough to be worth sending
+    to the geocoder. Google returns a single best guess, so addresses without
+    a town or province tend to resolve silently to the wrong place.
+
+    Args:
+        station (dict): Station data
+
+    Returns:
+        bool: True if the address has a street part plus a town or province
+    """
+    address = clean_text(station["address"])
+    if len(address) < 6 or not any(c.isalpha() for c in address):
+        return False
+    return bool(clean_text(station["town"]) or clean_text(station["province"]))
+
+
+async def validate_and_geocode_stations(stations_df, concurrent_requests=32):
     """
     Validate and geocode stations with missing coordinates asynchronously
     Args:
-        stations (dict): Dictionary of stations data
-        concurrent_requests (int): Max concurrent requests to Google API
+        stations_df (DataFrame): Stations table with lat/lng columns
+        concurrent_requests (int): Number of Google workers (rate is capped separately)
     Returns:
-        dict: Updated stations with geocoded coordinates
+        DataFrame: Stations table with geocoded coordinates filled in
     """
     if not GEOCODING_ENABLED:
         print("Geocoding is disabled. Using existing coordinates.")
-        return stations
+        return stations_df
+
+    coords = stations_df[["lat", "lng"]]
+    missing = coords.isna().any(axis=1) | (coords == 0).any(axis=1)
 
     stations_to_geocode = []
-    for station_id, station in stations.items():
-        coords = station["coordinates"]
-        if (
-            coords["lat"] is None
-            or coords["lng"] is None
-            or coords["lat"] == 0
-            or coords["lng"] == 0
-        ):
-            stations_to_geocode.append((station_id, station))
+    stations_skipped = []
+    for idx, station in stations_df[missing].to_dict(orient="index").items():
+        if is_geocodable(station):
+            stations_to_geocode.append((idx, station))
+        else:
+            stations_skipped.append(station)
+
+    # Always rewrite the file so a list from an earlier run never looks current
+    pd.DataFrame(
+        stations_skipped,
+        columns=["stationId", "stationName", "address", "town", "province"],
+    ).to_csv(SKIPPED_STATIONS_FILE, index=False)
+    if stations_skipped:
+        print(
+            f"Skipped {len(stations_skipped)} stations with incomplete addresses "
+            f"(see '{SKIPPED_STATIONS_FILE}')"
+        )
 
-    if not stations_to_geocode:
+    if not missing.any():
         print("All stations have valid coordinates.")
-        return stations
+        return stations_df
 
-    print(f"Found {len(stations_to_geocode)} stations with missing/invalid coordinates")
+    if not stations_to_geocode:
+        print("No geocodable stations with missing coordinates.")
+        return stations_df
 
-    semaphore = asyncio.Semaphore(concurrent_requests)
+    print(f"Found {len(stations_to_geocode)} stations with missing/invalid coordinates")
 
-    async def geocode_and_update(station_id, station, session):
-        address = (
-            f"{station['address']}, {station['town']}, {station['province']}, Argentina"
-        )
-        async with semaphore:
-            lat, lng = await geocode_address_async(session, address)
+    # Stations sharing an address are geocoded once and get the same result
+    address_groups = {}
+    for idx, station in stations_to_geocode:
+        address = station_address(station)
+        group = address_groups.setdefault(address_cache_key(address), (address, []))
+        group[1].append((idx, station))
+
+    # A fixed pool of workers drains the queue instead of one task per address.
+    # Google "not found" answers go to a separate queue with a single Nominatim worker, since
+    # Nominatim is throttled to 1 QPS and would otherwise stall the Google pool.
+    google_queue = asyncio.Queue()
+    nominatim_queue = asyncio.Queue()
+    for item in address_groups.values():
+        google_queue.put_nowait(item)
+    geocoded = []
+    progress = tqdm(total=len(stations_to_geocode), desc="Geocoding stations")
+
+    def record_result(address, stations, lat, lng):
+        for idx, station in stations:
             if lat and lng:
-                station["coordinates"]["lat"] = lat
-                station["coordinates"]["lng"] = lng
-                print(f"✅ {station_id}: {address} => {lat}, {lng}")
+                geocoded.append((idx, lat, lng))
+                logger.debug(
+                    "✅ %s: %s => %s, %s", station["stationId"], address, lat, lng
+                )
             else:
-                print(f"❌ {station_id}: {address} => Failed")
-            await asyncio.sleep(0.1)  # Respect API rate limit
-
-    async with aiohttp.ClientSession() as session:
-        tasks = [
-            geocode_and_update(station_id, station, session)
-            for station_id, station in stations_to_geocode
-        ]
-        for f in tqdm(
-            asyncio.as_completed(tasks), total=len(tasks), desc="Geocoding stations"
-        ):
-            await f
-    return stations
-
-
-def format_output(stations):
+                logger.warning("❌ %s: %s => Failed", station["stationId"], address)
+        progress.update(len(stations))
+
+    async def google_worker(client):
+        while True:
+            address, stations = await google_queue.get()
+            try:
+                lat, lng, status = await geocode_address_async(client, address, cache)
+                # Only definitive misses fall back; quota, auth and network
+                # errors would otherwise push the whole batch onto Nominatim
+                if status == "ZERO_RESULTS":
+                    nominatim_queue.put_nowait((address, stations))
+                else:
+                    record_result(address, stations, lat, lng)
+            except Exception as e:
+                # A dead worker would leave the queue unfinished and hang the run
+                logger.error("Error geocoding address '%s': %s", address, e)
+                record_result(address, stations, None, None)
+            finally:
+                google_queue.task_done()
+
+    async def nominatim_worker(client):
+        while True:
+            address, stations = await nominatim_queue.get()
+            try:
+                lat, lng = await geocode_nominatim(client, address, cache)
+                record_result(address, stations, lat, lng)
+            except Exception as e:
+                logger.error(
+                    "Error geocoding address '%s' with Nominatim: %s", address, e
+                )
+                record_result(address, stations, None, None)
+            finally:
+                nominatim_queue.task_done()
+
+    cache = GeocodeCache()
+    try:
+        # HTTP/2 multiplexes every request over one TLS connection per host
+        limits = httpx.Limits(
+            max_connections=concurrent_requests,
+            max_keepalive_connections=concurrent_requests,
+        )
+        async with httpx.AsyncClient(http2=True, timeout=10, limits=limits) as client:
+            workers = [
+                asyncio.create_task(google_worker(client))
+                for _ in range(concurrent_requests)
+            ]
+            workers.append(asyncio.create_task(nominatim_worker(client)))
+            # Every Google miss is queued for Nominatim before being marked done
+            await google_queue.join()
+            await nominatim_queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    finally:
+        progress.close()
+        geocoding_log_handler.flush()
+        cache.close()
+
+    # Write every new coordinate back in one vectorized assignment
+    if geocoded:
+        idx, lats, lngs = zip(*geocoded)
+        stations_df.loc[list(idx), ["lat", "lng"]] = np.column_stack([lats, lngs])
+    return stations_df
+
+
+def format_output(stations_df, products):
     """
     Format the stations data to the final output format
 
     Args:
-        stations (dict): Processed stations data
+        stations_df (DataFrame): Stations table, one row per station
+        products (dict): Products with prices keyed by station id
 
-    Returns:
-        list: Formatted stations data for JSON output
+    Yields:
+        dict: Formatted station entry for JSON output
     """
-    output = []
+    # Missing values become None so they serialize as null
+    stations_df = stations_df.astype(object).where(stations_df.notna(), None)
 
-    for station_id, station in stations.items():
+    for station in stations_df.to_dict(orient="records"):
         # Convert products from dict to list
-        products_list = list(station["products"].values())
+        products_list = list(products.get(station["stationId"], {}).values())
 
         # Create station entry
         station_entry = {
@@ -235,24 +640,72 @@ def format_output(stations):
             "flagId": station["flagId"],
             "geometry": {
                 "type": "Point",
-                "coordinates": [
-                    station["coordinates"]["lng"] or 0.0,
-                    station["coordinates"]["lat"] or 0.0,
-                ],
+                "coordinates": [station["lng"] or 0.0, station["lat"] or 0.0],
             },
             "products": products_list,
         }
 
-        output.append(station_entry)
+        yield station_entry
 
-    return output
+
+def write_json(station_entries, output_file):
+    """
+    Stream station entries to a file as an indented JSON array
+
+    Args:
+        station_entries (iterable): Formatted station entries
+        output_file (str): Path of the JSON file to write
+    """
+    with open(output_file, "wb") as f:
+        f.write(b"[\n")
+        for i, station_entry in enumerate(station_entries):
+            if i:
+                f.write(b",\n")
+            f.write(
+                orjson.dumps(
+                    station_entry,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY,
+                )
+            )
+        f.write(b"\n]\n")
+
+
+def write_ndjson(station_entries, output_file):
+    """
+    Stream station entries to a file as newline-delimited JSON (one per line)
+
+    Args:
+        station_entries (iterable): Formatted station entries
+        output_file (str): Path of the NDJSON file to write
+    """
+    with open(output_file, "wb") as f:
+        for station_entry in station_entries:
+            f.write(
+                orjson.dumps(
+                    station_entry,
+                    option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY,
+                )
+            )
 
 
 def main():
     # Read the CSV file
     print("Reading CSV file...")
     try:
-        df = pd.read_csv("precios-historicos.csv")
+        df = pd.read_csv(
+            "precios-historicos.csv",
+            engine="pyarrow",
+            usecols=CSV_COLUMNS,
+            dtype_backend="pyarrow",
+        )
+        for column in STRING_COLUMNS:
+            df[column] = df[column].astype("string[pyarrow]")
+        # Stray text in numeric columns becomes NaN instead of an object column,
+        # and whole-number columns stay floats so prices are always written as 100.0
+        for column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype(
+                "double[pyarrow]"
+            )
         print(f"Successfully read {len(df)} rows")
     except Exception as e:
         print(f"Error reading CSV file: {e}")
@@ -260,27 +713,26 @@ def main():
 
     # Process stations and prices
     print("\nProcessing stations and prices...")
-    stations = process_stations(df)
-    print(f"Processed {len(stations)} stations")
+    stations_df, products = process_stations_parallel(df)
+    print(f"Processed {len(stations_df)} stations")
 
     # Validate and geocode coordinates if needed (async)
     print("\nValidating and geocoding coordinates...")
     if GEOCODING_ENABLED:
-        stations = asyncio.run(
-            validate_and_geocode_stations(stations, concurrent_requests=5)
+        stations_df = asyncio.run(
+            validate_and_geocode_stations(stations_df, concurrent_requests=32)
         )
-    else:
-        stations = stations
-
-    # Format the output
-    print("\nFormatting output...")
-    output_data = format_output(stations)
 
-    # Write to JSON file
-    output_file = "stations_prices.json"
+    # Format the output and stream it to the file one station at a time
+    print("\nWriting output...")
+    if OUTPUT_FORMAT == "ndjson":
+        output_file = "stations_prices.ndjson"
+        write_output = write_ndjson
+    else:
+        output_file = "stations_prices.json"
+        write_output = write_json
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        write_output(format_output(stations_df, products), output_file)
         print(f"\n✅ Successfully saved data to {output_file}")
     except Exception as e:
         print(f"Error writing to {output_file}: {e}")